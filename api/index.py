@@ -1,13 +1,20 @@
 from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+import functools
+import io
+import logging
 import mido
+import numpy as np
+import orjson
 import os
 import random
-import time
-
-import json
+import struct
+from mido.midifiles.midifiles import write_chunk, write_track
+from pathlib import Path
 
 app = FastAPI()
+logger = logging.getLogger(__name__)
 
 # --- Music Theory Constants ---
 
@@ -31,6 +38,10 @@ SCALES = {
     "major (7th focused)": [0, 2, 4, 5, 7, 9, 11] # Maps to Major
 }
 
+# Interval arrays for vectorized scale building (up to 4 octaves)
+SCALE_ARRAYS = {name: np.array(intervals, dtype=np.int16) for name, intervals in SCALES.items()}
+OCTAVE_OFFSETS = np.arange(4, dtype=np.int16)[:, None] * 12
+
 # Flavor Notes (Interval indices to emphasize)
 FLAVOR_NOTES = {
     "phrygian": [1],    # b2
@@ -44,14 +55,17 @@ FLAVOR_NOTES = {
 # Configs are now in the same directory as this script for Vercel compatibility
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "style_config.json")
 try:
-    with open(CONFIG_PATH, "r") as f:
-        STYLE_DATA = json.load(f)["styles"]
+    STYLE_DATA = orjson.loads(Path(CONFIG_PATH).read_bytes())["styles"]
         
     CHORD_PATH = os.path.join(os.path.dirname(__file__), "chord_progressions.json")
-    with open(CHORD_PATH, "r") as f:
-        CHORD_DATA = json.load(f)["progressions"]
+    CHORD_DATA = orjson.loads(Path(CHORD_PATH).read_bytes())["progressions"]
+
+    # Store roots/scales as tuples so random.choice indexes them directly
+    for _style in STYLE_DATA.values():
+        _style["roots"] = tuple(_style["roots"])
+        _style["scales"] = tuple(_style["scales"])
 except Exception as e:
-    print(f"Error loading config: {e}")
+    logger.error("Error loading config: %s", e)
     STYLE_DATA = {}
     CHORD_DATA = {}
 
@@ -66,6 +80,10 @@ LEGACY_STYLE_CONFIG = {
     "dilla": {"scale": "dorian", "root": 61, "swing": True, "swing_amt": 0.58, "tempo_range": (88, 92)}
 }
 
+# Precomputed name fragments for generate_track_name
+_CLEAN_SCALE = {scale: scale.title().replace(" ", "") for scale in SCALES}
+_TITLE_STYLE = {style: style.title() for style in LEGACY_STYLE_CONFIG}
+
 DRUM_MAP = {
     "kick": 36,
     "snare": 38,
@@ -74,7 +92,11 @@ DRUM_MAP = {
     "clap": 39
 }
 
+# Output tracks by channel, in file order
+TRACK_NAMES = {0: "Bass", 1: "Melody", 2: "Chords", 9: "Drums"}
+
 TICKS_PER_BEAT = 480
+_HALF_BEAT = TICKS_PER_BEAT // 2
 
 NOTE_NAME_TO_MIDI = {
     "C": 0, "C#": 1, "Db": 1, "D": 2, "D#": 3, "Eb": 3, "E": 4, 
@@ -83,44 +105,60 @@ NOTE_NAME_TO_MIDI = {
 }
 
 # --- Name Generation ---
-ADJECTIVES = ["Crimson", "Midnight", "Neon", "Dusty", "Electric", "Silent", "Hidden", "Cosmic", "Urban", "Vintage", "Liquid", "Solar", "Broken", "Golden", "Dark", "Hollow", "Vivid", "Static", "Digital", "Analog"]
-NOUNS = ["Echo", "Vibe", "Pulse", "Dream", "Shadow", "Loop", "Storm", "Drift", "Flow", "Signal", "Noise", "Haze", "Groove", "Wave", "Rider", "Soul", "Glitch", "Mode", "Vision", "Sequence"]
+ADJECTIVES = ("Crimson", "Midnight", "Neon", "Dusty", "Electric", "Silent", "Hidden", "Cosmic", "Urban", "Vintage", "Liquid", "Solar", "Broken", "Golden", "Dark", "Hollow", "Vivid", "Static", "Digital", "Analog")
+NOUNS = ("Echo", "Vibe", "Pulse", "Dream", "Shadow", "Loop", "Storm", "Drift", "Flow", "Signal", "Noise", "Haze", "Groove", "Wave", "Rider", "Soul", "Glitch", "Mode", "Vision", "Sequence")
 
 def generate_track_name(style, scale, bpm, root_name):
     adj = random.choice(ADJECTIVES)
     noun = random.choice(NOUNS)
     # Random suffix like X92, 007, etc
-    suffix = f"{random.choice(['A','X','Z','V'])}{random.randint(10,99)}"
+    suffix = f"{random.choice(('A','X','Z','V'))}{random.randint(10,99)}"
     
     # Format: AdjectiveNoun_Style_RootScale_BPM_Suffix
     # Clean scale name (remove spaces)
-    clean_scale = scale.title().replace(" ", "")
-    title = f"{adj}{noun}_{style.title()}_{root_name}{clean_scale}_{bpm}_{suffix}"
+    clean_scale = _CLEAN_SCALE.get(scale) or scale.title().replace(" ", "")
+    title_style = _TITLE_STYLE.get(style) or style.title()
+    title = f"{adj}{noun}_{title_style}_{root_name}{clean_scale}_{bpm}_{suffix}"
     return title
 
 # --- Helper Functions ---
 
-def get_style_context(style_name):
-    # Normalize style name lookup
+# Map lowercase id to Display Name for JSON lookup
+# JSON keys are like "Boom Bap", user passes "boombap"
+ID_MAP = {
+    "boombap": "Boom Bap", "trap": "Trap", "drill": "Drill",
+    "storch": "Storch", "edm": "EDM", "flume": "Flume", "dilla": "Dilla"
+}
+
+@functools.lru_cache(maxsize=32)
+def _get_style_template(style_name):
+    """
+    Resolves the deterministic part of a style context.
+    Returns (roots, scales, legacy); roots/scales are empty if the style has no JSON data.
+    """
     # Only map if exists in JSON, else fallback
-    # JSON keys are like "Boom Bap", user passes "boombap"
-    
-    # Map lowercase id to Display Name for JSON lookup
-    ID_MAP = {
-        "boombap": "Boom Bap", "trap": "Trap", "drill": "Drill",
-        "storch": "Storch", "edm": "EDM", "flume": "Flume", "dilla": "Dilla"
-    }
-    
     display_name = ID_MAP.get(style_name, "Boom Bap")
     data = STYLE_DATA.get(display_name)
     
     if not data:
+        return (), (), LEGACY_STYLE_CONFIG.get(style_name, LEGACY_STYLE_CONFIG["boombap"])
+
+    # Merge with legacy props for swing/tempo logic
+    # (We rely on legacy config for non-theory props for now)
+    legacy = LEGACY_STYLE_CONFIG.get(style_name, {})
+    scales = tuple(scale.lower() for scale in data["scales"])
+    return data["roots"], scales, legacy
+
+def get_style_context(style_name):
+    roots, scales, legacy = _get_style_template(style_name)
+    
+    if not roots:
         # Fallback
-        return LEGACY_STYLE_CONFIG.get(style_name, LEGACY_STYLE_CONFIG["boombap"])
+        return legacy
 
     # Dynamic Selection
-    root_name = random.choice(data["roots"])
-    scale_name = random.choice(data["scales"]).lower()
+    root_name = random.choice(roots)
+    scale_name = random.choice(scales)
     
     # Calculate midi root (Octave 4 = 60 starts at C4)
     # 60 is C4
@@ -128,10 +166,6 @@ def get_style_context(style_name):
     # Ensure it's not too high
     if base_midi > 71: base_midi -= 12
     
-    # Merge with legacy props for swing/tempo logic
-    # (We rely on legacy config for non-theory props for now)
-    legacy = LEGACY_STYLE_CONFIG.get(style_name, {})
-    
     return {
         "root": base_midi,
         "root_name": root_name,
@@ -142,138 +176,205 @@ def get_style_context(style_name):
     }
 
 def get_scale_notes(root, scale_name, octaves=2):
-    intervals = SCALES.get(scale_name, SCALES["minor"])
-    notes = []
-    for oct in range(octaves):
-        base = root + (oct * 12)
-        for interval in intervals:
-            notes.append(base + interval)
-    return notes
-
-def add_note(events, note, beat_pos, velocity, duration, channel, style_cfg):
-    # Dilla Swing Logic
-    tick_pos = int(beat_pos * TICKS_PER_BEAT)
-    
-    swing_amt = style_cfg.get("swing_amt", 0.55) if style_cfg.get("swing") else 0
+    """Returns the ascending scale notes over `octaves` octaves as an ndarray."""
+    intervals = SCALE_ARRAYS.get(scale_name, SCALE_ARRAYS["minor"])
+    return (root + (OCTAVE_OFFSETS[:octaves] + intervals)).ravel()
+
+NOTE_ON = 0
+NOTE_OFF = 1
+EVENT_TYPES = ("note_on", "note_off")
+
+class EventBuffer:
+    """
+    Struct-of-arrays event store for one channel: one row per note_on/note_off.
+    Columns grow by doubling so writes stay slice assignments.
+    """
+    def __init__(self, capacity=1024):
+        self.ticks = np.zeros(capacity, dtype=np.int32)
+        self.types = np.zeros(capacity, dtype=np.int32)
+        self.notes = np.zeros(capacity, dtype=np.int32)
+        self.velocities = np.zeros(capacity, dtype=np.int32)
+        self.cursor = 0
+
+    def grow(self, needed):
+        capacity = len(self.ticks)
+        while capacity < needed:
+            capacity *= 2
+        for name in ("ticks", "types", "notes", "velocities"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.cursor] = column[:self.cursor]
+            setattr(self, name, grown)
+
+    def add_notes(self, on_ticks, off_ticks, notes, velocities):
+        """Writes a note_on row followed by its note_off row for every note."""
+        start = self.cursor
+        end = start + 2 * len(on_ticks)
+        if end > len(self.ticks):
+            self.grow(end)
+        self.ticks[start:end:2] = on_ticks
+        self.ticks[start + 1:end:2] = off_ticks
+        self.types[start:end:2] = NOTE_ON
+        self.types[start + 1:end:2] = NOTE_OFF
+        self.notes[start:end:2] = notes
+        self.notes[start + 1:end:2] = notes
+        self.velocities[start:end:2] = velocities
+        self.velocities[start + 1:end:2] = 0
+        self.cursor = end
+
+    def view(self):
+        """Returns (ticks, types, notes, velocities) sorted by tick, trimmed to the filled rows."""
+        n = self.cursor
+        # Stable, so same-tick events keep emission order
+        order = np.argsort(self.ticks[:n], kind="stable")
+        return self.ticks[order], self.types[order], self.notes[order], self.velocities[order]
+
+def swing_tick_offset(style_cfg):
+    """Ticks to push off-beat 8ths by for this style (0 when it doesn't swing)."""
+    if not style_cfg.get("swing"):
+        return 0
+    return int((style_cfg.get("swing_amt", 0.55) - 0.5) * TICKS_PER_BEAT)
+
+def emit(events, hits, swing_offset):
+    """
+    Writes planned (beat, note, velocity, duration) hits into `events`.
+    Swing and humanization are applied to the whole batch at once.
+    """
+    if not hits:
+        return
+    beats, notes, velocities, durations = np.array(hits, dtype=np.float64).T
+    n = len(beats)
+    tick_pos = (beats * TICKS_PER_BEAT).astype(np.int32)
     
-    # 8th note swing
-    beat_int = int(beat_pos)
-    fraction = beat_pos - beat_int
+    # Dilla Swing Logic
+    if swing_offset:
+        # 8th note swing: push off-beat 8ths (beats are multiples of 1/16, so compare on ticks)
+        tick_pos[(tick_pos % TICKS_PER_BEAT) == _HALF_BEAT] += swing_offset
     
-    if swing_amt > 0:
-        # Check for off-beat 8th
-        if abs(fraction - 0.5) < 0.05:
-            tick_pos = int((beat_int + swing_amt) * TICKS_PER_BEAT)
-            
     # Humanize velocity
-    velocity = max(1, min(127, velocity + random.randint(-5, 5)))
+    velocities = (velocities.astype(np.int32) + np.random.randint(-5, 6, n)).clip(1, 127)
     
     # Humanize timing (slight)
-    tick_pos += random.randint(-10, 10)
-    if tick_pos < 0: tick_pos = 0
-
-    events.append({"tick": tick_pos, "type": "note_on", "note": note, "velocity": velocity, "channel": channel})
-    events.append({"tick": tick_pos + int(duration * TICKS_PER_BEAT), "type": "note_off", "note": note, "velocity": 0, "channel": channel})
+    tick_pos = (tick_pos + np.random.randint(-10, 11, n)).clip(min=0)
+    
+    off_ticks = tick_pos + (durations * TICKS_PER_BEAT).astype(np.int32)
+    events.add_notes(tick_pos, off_ticks, notes.astype(np.int32), velocities)
 
 # --- Generators ---
 
-def generate_drums(events, style, context, bars):
+def generate_drums(events, style, context, bars, rng):
     # Channel 9 (0-indexed = 10)
-    channel = 9
     cfg = context
+    swing_offset = swing_tick_offset(cfg)
+    rand = rng.random
+    randint = rng.randint
     
     k = DRUM_MAP["kick"]
     s = DRUM_MAP["snare"]
     h = DRUM_MAP["hat_closed"]
     c = DRUM_MAP["clap"] # Use for Trap/Drill snare
+    hits = []
     
     if style in ["trap", "drill"]:
         snare_note = c
     else:
         snare_note = s
+    
+    # Style dispatch, resolved once instead of per hi-hat step
+    # Hi-Hats: Basic 8ths or 16ths
+    res = 0.5 # 8th notes
+    if style in ("trap", "drill", "edm"):
+        res = 0.25 # 16th notes
+    steps = int(4 / res)
+    
+    # Velocity Logic
+    if style in ("boombap", "dilla"):
+        def velocity_fn(i):
+            # High dynamic range (Ghost notes)
+            # Randomize heavily between 50 and 90
+            vel = randint(50, 95)
+            if i % 2 == 0: vel += 10 # Slight accent on grid
+            return min(vel, 105)
+    else:
+        def velocity_fn(i):
+            # Standard Accents
+            # Lower base from 100/70 to 85/60
+            return 85 if (i % 2 == 0) else 60
+    
+    # Trap rolls
+    roll_prob = 0.15 if style == "trap" else 0.0
 
     # Randomized patterns per bar
     for bar in range(bars):
         offset = bar * 4
         
-        # Hi-Hats
-        # Basic 8ths or 16ths
-        res = 0.5 # 8th notes
-        if style in ["trap", "drill", "edm"]:
-             res = 0.25 # 16th notes
-        
-        steps = int(4 / res)
         for i in range(steps):
              # Randomize removal for variety
-            if random.random() > 0.1:
-                # Trap rolls
-                if style == "trap" and random.random() < 0.15:
-                    # 32nd notes roll
-                    base_pos = offset + (i * res)
-                    for r in range(4):
-                        # Softer rolls
-                        add_note(events, h, base_pos + (r*0.0625), 60, 0.06, channel, cfg)
+            if rand() > 0.1:
+                pos = offset + (i * res)
+                if roll_prob and rand() < roll_prob:
+                    # 32nd notes roll, softer
+                    hits.append((pos, h, 60, 0.06))
+                    hits.append((pos + 0.0625, h, 60, 0.06))
+                    hits.append((pos + 0.125, h, 60, 0.06))
+                    hits.append((pos + 0.1875, h, 60, 0.06))
                 else:
-                    # Velocity Logic
-                    if style in ["boombap", "dilla"]:
-                        # High dynamic range (Ghost notes)
-                        # Randomize heavily between 50 and 90
-                        vel = random.randint(50, 95)
-                        if i % 2 == 0: vel += 10 # Slight accent on grid
-                        vel = min(vel, 105)
-                    else:
-                        # Standard Accents
-                        # Lower base from 100/70 to 85/60
-                        vel = 85 if (i % 2 == 0) else 60
-                        
-                    add_note(events, h, offset + (i * res), vel, 0.1, channel, cfg)
+                    hits.append((pos, h, velocity_fn(i), 0.1))
 
         # Kick & Snare Context
         # Standard Backbeat
-        add_note(events, snare_note, offset + 1, 110, 0.2, channel, cfg)
-        add_note(events, snare_note, offset + 3, 110, 0.2, channel, cfg)
+        hits.append((offset + 1, snare_note, 110, 0.2))
+        hits.append((offset + 3, snare_note, 110, 0.2))
         
         # Kick Pattern
-        add_note(events, k, offset + 0, 120, 0.2, channel, cfg)
+        hits.append((offset + 0, k, 120, 0.2))
         
         # Style specific additions
         if style == "boombap" or style == "dilla":
             # Kicks on offbeats
-            if random.random() > 0.4: add_note(events, k, offset + 2.5, 100, 0.2, channel, cfg)
-            if random.random() > 0.6: add_note(events, k, offset + 1.5, 90, 0.2, channel, cfg)
+            if rand() > 0.4: hits.append((offset + 2.5, k, 100, 0.2))
+            if rand() > 0.6: hits.append((offset + 1.5, k, 90, 0.2))
             
         elif style == "trap":
-            if random.random() > 0.5: add_note(events, k, offset + 2.75, 110, 0.2, channel, cfg)
-            if random.random() > 0.5: add_note(events, k, offset + 3.5, 100, 0.2, channel, cfg)
+            if rand() > 0.5: hits.append((offset + 2.75, k, 110, 0.2))
+            if rand() > 0.5: hits.append((offset + 3.5, k, 100, 0.2))
             
         elif style == "drill":
             # Drill has snare on 4th beat of half-time (beat 2 of measure?) No usually beat 3 or 4 
             # UK Drill: Snare on 3 and 8 (in 8/4) -> Beat 1.5 and 3.5? No, typically beat 3.
             # Let's keep simple backbeat but add ghost snares
-            if random.random() > 0.6: add_note(events, k, offset + 3.5, 95, 0.2, channel, cfg)
+            if rand() > 0.6: hits.append((offset + 3.5, k, 95, 0.2))
             
         elif style == "edm":
             # 4 on the floor
-            add_note(events, k, offset + 1, 120, 0.2, channel, cfg)
-            add_note(events, k, offset + 2, 120, 0.2, channel, cfg)
-            add_note(events, k, offset + 3, 120, 0.2, channel, cfg)
+            hits.append((offset + 1, k, 120, 0.2))
+            hits.append((offset + 2, k, 120, 0.2))
+            hits.append((offset + 3, k, 120, 0.2))
+    
+    emit(events, hits, swing_offset)
 
-def generate_bass(events, context, bars):
+def generate_bass(events, context, bars, rng):
     # Channel 0
-    channel = 0
     # Context is now the dict
     cfg = context 
+    swing_offset = swing_tick_offset(cfg)
     style_name_dummy = "boombap" # Placeholder if needed
     
     root = cfg["root"] - 24 # Drop 2 octaves
     scale = get_scale_notes(root, cfg["scale"], 1)
+    hits = []
+    
+    # Local bindings for the per-bar random picks
+    scale_arr = scale.tolist()
+    n = len(scale_arr)
+    rnd = rng.random
     
     # Simple probability-based sequencer
     for bar in range(bars):
         offset = bar * 4
         
         # Root note on 1 is common
-        add_note(events, scale[0], offset + 0, 100, 0.8, channel, cfg)
+        hits.append((offset + 0, scale_arr[0], 100, 0.8))
         
         # Random hits (Generic logic reuse)
         # We need style info? Since 'context' has merged data, we can check props
@@ -286,12 +387,22 @@ def generate_bass(events, context, bars):
         # Let's just make Bass generic "Root + Fifth + Octave" for safety
         # OR bring back style name.
         
-        if random.random() > 0.4:
-            add_note(events, random.choice(scale), offset + 1.5, 85, 0.4, channel, cfg)
-        if random.random() > 0.4:
-            add_note(events, random.choice(scale), offset + 3, 90, 0.4, channel, cfg)
-
-def generate_rhythm_motif(bars=1):
+        if rnd() > 0.4:
+            hits.append((offset + 1.5, scale_arr[int(rnd() * n)], 85, 0.4))
+        if rnd() > 0.4:
+            hits.append((offset + 3, scale_arr[int(rnd() * n)], 90, 0.4))
+    
+    emit(events, hits, swing_offset)
+
+# Weighted duration choice:
+# 0.5 (8th) = 50%, 1.0 (Quarter) = 30%, 0.25 (16th) = 10%, 1.5 (Dotted) = 10%
+_DUR_VALUES = (0.5, 1.0, 0.25, 1.5)
+_DUR_CUM = (0.5, 0.8, 0.9, 1.0)
+# Gap after a note: none = 85%, 8th rest = 7.5%, quarter rest = 7.5%
+_REST_VALUES = (0, 0.5, 1.0)
+_REST_CUM = (0.85, 0.925, 1.0)
+
+def generate_rhythm_motif(rng, bars=1):
     """
     Generates a rhythmic pattern (offsets) for a given number of bars.
     Prefers on-beat and 8th notes, with occasional syncopation.
@@ -300,14 +411,14 @@ def generate_rhythm_motif(bars=1):
     current_beat = 0
     end_beat = bars * 4
     
-    while current_beat < end_beat:
-        # Weighted duration choice: 
-        # 0.5 (8th) = 50%, 1.0 (Quarter) = 30%, 0.25 (16th) = 10%, 1.5 (Dotted) = 10%
-        r = random.random()
-        if r < 0.5: dur = 0.5
-        elif r < 0.8: dur = 1.0
-        elif r < 0.9: dur = 0.25
-        else: dur = 1.5
+    # Draw every duration and rest up front; 16ths everywhere is the most hits possible
+    k = bars * 16
+    durs = rng.choices(_DUR_VALUES, cum_weights=_DUR_CUM, k=k)
+    rests = rng.choices(_REST_VALUES, cum_weights=_REST_CUM, k=k)
+    
+    for dur, rest in zip(durs, rests):
+        if current_beat >= end_beat:
+            break
         
         # Don't hold note into next beat pattern awkwardly
         if current_beat + dur > end_beat:
@@ -315,56 +426,49 @@ def generate_rhythm_motif(bars=1):
             
         rhythm.append({"beat": current_beat, "duration": dur})
         
-        # Gap chance (Rest) - 20%
-        # If we didn't add a rest, current_beat advances by dur
-        # If we want a rest, we add to current_beat but don't append a note event?
-        # Simpler: The rhythm list defines where NOTES start.
-        # We need to decide the gap to next note.
-        
-        # Advance time
-        current_beat += dur
-        
-        # Occasional rest
-        if random.random() < 0.15:
-            current_beat += random.choice([0.5, 1.0])
+        # Advance time, plus the occasional rest
+        current_beat += dur + rest
             
     return rhythm
 
+# Random Walk: -2, -1, 0, +1, +2 steps in scale
+_STEP_VALS = np.array([-2, -1, 0, 1, 2])
+_STEP_P = np.array([0.1, 0.3, 0.2, 0.3, 0.1])
+
 def generate_melodic_phrase(scale, start_note, rhythm_pattern):
     """
     Maps a rhythm pattern to notes using a 'Random Walk' approach.
     Avoids large jumps; prefers stepwise motion.
     """
     phrase = []
-    current_note = start_note
     scale_len = len(scale)
     
-    # Find index of start_note in scale (approximate)
-    try:
-        current_idx = scale.index(current_note)
-    except ValueError:
-        current_idx = 0 # Fallback
-        
-    for hit in rhythm_pattern:
-        # Random Walk: -2, -1, 0, +1, +2 steps in scale
-        step = random.choices([-2, -1, 0, 1, 2], weights=[0.1, 0.3, 0.2, 0.3, 0.1])[0]
-        
-        # Bounce off boundaries
-        next_idx = current_idx + step
-        if next_idx < 0: next_idx = 1
-        if next_idx >= scale_len: next_idx = scale_len - 2
-        
-        current_idx = next_idx
-        note = scale[current_idx]
-        
+    # Find index of start_note in scale (approximate; scale is ascending)
+    current_idx = int(np.searchsorted(scale, start_note))
+    if current_idx == scale_len: current_idx = scale_len - 1
+    
+    # One draw for the whole phrase
+    steps = np.random.choice(_STEP_VALS, size=len(rhythm_pattern), p=_STEP_P).tolist()
+    
+    # Bounce off boundaries (path-dependent, so walked rather than cumsum'd)
+    idx = []
+    for step in steps:
+        current_idx += step
+        if current_idx < 0: current_idx = 1
+        if current_idx >= scale_len: current_idx = scale_len - 2
+        idx.append(current_idx)
+    
+    for hit, note in zip(rhythm_pattern, scale[idx].tolist()):
         phrase.append({"beat": hit["beat"], "duration": hit["duration"], "note": note})
         
     return phrase
 
-def generate_melody(events, context, bars):
+def generate_melody(events, context, bars, rng):
     # Channel 1
-    channel = 1
     cfg = context
+    swing_offset = swing_tick_offset(cfg)
+    rand = rng.random
+    choice = rng.choice
     root = cfg["root"]
     scale_name = cfg["scale"]
     
@@ -377,7 +481,7 @@ def generate_melody(events, context, bars):
     # --- Form: A - A' - A - B (Call & Response) ---
     
     # 1. Generate Motif A (1 Bar Rhythm)
-    rhythm_a = generate_rhythm_motif(bars=1)
+    rhythm_a = generate_rhythm_motif(rng, bars=1)
     
     # 2. Generate Melody for A
     # Start near the middle of the scale
@@ -412,7 +516,7 @@ def generate_melody(events, context, bars):
     
     # Bar 4: Phrase B (Resolution/Turnaround)
     # Different rhythm often longer notes or resolving to root
-    rhythm_b = generate_rhythm_motif(bars=1)
+    rhythm_b = generate_rhythm_motif(rng, bars=1)
     # Force end on root?
     phrase_b = generate_melodic_phrase(scale, scale[0], rhythm_b)
     # Last note overwrite to root
@@ -426,6 +530,7 @@ def generate_melody(events, context, bars):
     
     # 4. Apply to global events (Repeat for total bars)
     # 'loop_events' covers 4 bars.
+    hits = []
     
     for bar_chunk in range(0, bars, 4):
         chunk_offset = bar_chunk * 4
@@ -433,17 +538,21 @@ def generate_melody(events, context, bars):
         for ev in loop_events:
             # Final probability check for Flavor
             note = ev["note"]
-            if flavors and random.random() < 0.2:
+            if flavors and rand() < 0.2:
                  # Inject flavor occasionally
-                 f_idx = random.choice(flavors)
+                 f_idx = choice(flavors)
                  if f_idx < len(scale): note = scale[f_idx]
 
-            add_note(events, note, chunk_offset + ev["beat"], 90, ev["duration"], channel, cfg)
+            hits.append((chunk_offset + ev["beat"], note, 90, ev["duration"]))
+    
+    emit(events, hits, swing_offset)
 
-def generate_chords(events, context, bars):
+def generate_chords(events, context, bars, rng):
     # Channel 2
-    channel = 2
     cfg = context
+    swing_offset = swing_tick_offset(cfg)
+    rand = rng.random
+    choice = rng.choice
     root = cfg["root"] - 12 # Mid-range
     scale = get_scale_notes(root, cfg["scale"], 2)
     
@@ -451,12 +560,14 @@ def generate_chords(events, context, bars):
     # Just pick random category for now, or mix
     categories = list(CHORD_DATA.keys()) if CHORD_DATA else []
     if categories:
-        cat = random.choice(categories)
-        progression = random.choice(CHORD_DATA[cat])
+        cat = choice(categories)
+        progression = choice(CHORD_DATA[cat])
     else:
+        cat = None
         progression = [0, 3, 4, 0] # Fallback
         
-    print(f"Selected Chord Progression ({cat}): {progression}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Selected Chord Progression (%s): %s", cat, progression)
     
     # Generate Chords
     current_bar = 0
@@ -465,6 +576,7 @@ def generate_chords(events, context, bars):
     # We want to fill 'bars' amount of time
     total_beats = bars * 4
     current_beat = 0
+    hits = []
     
     while current_beat < total_beats:
         degree_idx = progression[prog_idx % len(progression)]
@@ -472,7 +584,7 @@ def generate_chords(events, context, bars):
         # Harmonic Rhythm: Randomize duration (2 beats or 4 beats)
         # 70% chance of 4 beats (1 bar), 30% chance of 2 beats (half bar)
         duration = 4
-        if random.random() < 0.3:
+        if rand() < 0.3:
             duration = 2
             
         # Ensure we don't overflow total length
@@ -488,36 +600,40 @@ def generate_chords(events, context, bars):
         # Add Notes
         offset = current_beat
         for note in chord_notes:
-             add_note(events, note, offset, 70, duration, channel, cfg)
+             hits.append((offset, note, 70, duration))
              
         current_beat += duration
         prog_idx += 1
+    
+    emit(events, hits, swing_offset)
 
-@app.get("/api/generate")
-def generate_midi(style: str, bpm: int, bars: int = 4, chords: bool = False):
-    mid = mido.MidiFile()
+@functools.lru_cache(maxsize=64)
+def _meta_track_bytes(bpm):
+    """Serialized MTrk chunk for the meta track; identical for every request at this BPM."""
+    # Track 0: Meta (Tempo, Time Sig)
+    track_meta = mido.MidiTrack()
+    track_meta.append(mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm)))
+    track_meta.append(mido.MetaMessage('time_signature', numerator=4, denominator=4))
     
+    buf = io.BytesIO()
+    write_track(buf, track_meta)
+    return buf.getvalue()
+
+def _build_midi(style, context, bpm, bars, chords):
+    """Generates all tracks for one request and returns the serialized MIDI file."""
     # 3 Tracks: Bass, Melody, Drums, Chords
     # Mido tracks are just lists of messages. 
     # For Format 1 MIDI, we can have separate tracks.
     # But for simplicity, we can put everything in one track or separate.
     # Let's do separate tracks for cleaner import in DAWs.
-    
-    # Track 0: Meta (Tempo, Time Sig)
-    track_meta = mido.MidiTrack()
-    mid.tracks.append(track_meta)
-    track_meta.append(mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm)))
-    track_meta.append(mido.MetaMessage('time_signature', numerator=4, denominator=4))
-
-    # Pattern Generation
-    # Dynamic Context
-    context = get_style_context(style)
-    # Log for debugging (print to console)
-    print(f"Generating {style} | Root: {context['root']} | Scale: {context['scale']}")
+    tracks = []
 
     # Pattern Generation
-    all_events = []
-    generate_drums(all_events, style, context, bars)
+    # One buffer per channel: Bass (Ch 0), Melody (Ch 1), Chords (Ch 2), Drums (Ch 9/10)
+    track_events = {ch: EventBuffer() for ch in TRACK_NAMES}
+    # Per-request RNG, threaded through the generators
+    rng = random.Random()
+    generate_drums(track_events[9], style, context, bars, rng)
     
     # Pass context instead of style name where applicable?
     # Our generators take "style" str and look up config internally.
@@ -534,61 +650,53 @@ def generate_midi(style: str, bpm: int, bars: int = 4, chords: bool = False):
     # But wait, generators define their own channel/config logic.
     # Let's Modify the generators now to take 'context'
     
-    generate_bass(all_events, context, bars)
-    generate_melody(all_events, context, bars)
+    generate_bass(track_events[0], context, bars, rng)
+    generate_melody(track_events[1], context, bars, rng)
     
     if chords:
-        generate_chords(all_events, context, bars)
-    
-    # Sort all events by tick
-    all_events.sort(key=lambda x: x["tick"])
-    
-    # Let's split into tracks: Drums (Ch 9/10), Bass (Ch 0), Melody (Ch 1), Chords (Ch 2)
-    # Re-sort events into specific track lists
-    tracks_events = {0: [], 1: [], 2: [], 9: []} # Bass, Melody, Chords, Drums
+        generate_chords(track_events[2], context, bars, rng)
     
-    for e in all_events:
-        ch = e["channel"]
-        if ch not in tracks_events: tracks_events[ch] = []
-        tracks_events[ch].append(e)
-        
     # Write to Mido Tracks
-    for ch, events in tracks_events.items():
-        track = mido.MidiTrack()
-        mid.tracks.append(track)
-        
-        # Add Track Name
-        if ch == 9: name = "Drums"
-        elif ch == 0: name = "Bass"
-        elif ch == 1: name = "Melody"
-        else: name = "Chords"
-        track.append(mido.MetaMessage('track_name', name=name))
+    for ch, events in track_events.items():
+        track = mido.MidiTrack([mido.MetaMessage('track_name', name=TRACK_NAMES[ch])])
+        tracks.append(track)
         
-        last_tick = 0
-        events.sort(key=lambda x: x["tick"])
+        ticks, types, notes, velocities = events.view()
+        # Delta times from the sorted ticks (first event is relative to 0)
+        deltas = np.diff(ticks, prepend=0).clip(min=0)
         
-        for e in events:
-            delta = e["tick"] - last_tick
-            if delta < 0: delta = 0
-            track.append(mido.Message(e["type"], note=e["note"], velocity=e["velocity"], time=delta, channel=ch))
-            last_tick = e["tick"]
-    
-    # Save
-    temp_dir = "/tmp" if os.path.exists("/tmp") else os.path.dirname(__file__)
-    if not os.path.exists("/tmp"):
-        import tempfile
-        temp_dir = tempfile.gettempdir()
+        track.extend(
+            mido.Message(EVENT_TYPES[type_code], note=note, velocity=velocity, time=delta, channel=ch)
+            for type_code, note, velocity, delta in zip(
+                types.tolist(), notes.tolist(), velocities.tolist(), deltas.tolist()
+            )
+        )
+    
+    # Serialize in memory: Format 1 header, cached meta track, then the content tracks
+    buf = io.BytesIO()
+    write_chunk(buf, b'MThd', struct.pack('>hhh', 1, len(tracks) + 1, TICKS_PER_BEAT))
+    buf.write(_meta_track_bytes(bpm))
+    for track in tracks:
+        write_track(buf, track)
+    return buf.getvalue()
 
-    output_file = os.path.join(temp_dir, f"beat_{int(time.time())}.mid")
-    mid.save(output_file)
+@app.get("/api/generate")
+async def generate_midi(style: str, bpm: int, bars: int = 4, chords: bool = False):
+    # Dynamic Context
+    context = get_style_context(style)
+    # Log for debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Generating %s | Root: %s | Scale: %s", style, context['root'], context['scale'])
+    
+    # Generation is CPU-bound, keep it off the event loop
+    data = await run_in_threadpool(_build_midi, style, context, bpm, bars, chords)
     
     # Generate Creative Filename
     filename = f"{generate_track_name(style, context['scale'], bpm, context['root_name'])}.mid"
     
     # Return with explicit filename in content-disposition
-    return FileResponse(
-        output_file, 
-        media_type="audio/midi", 
-        filename=filename,
+    return Response(
+        content=data,
+        media_type="audio/midi",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )